@@ -1,15 +1,29 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, Header
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import StreamingResponse
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.errors import DuplicateKeyError
 import os
 import logging
 from pathlib import Path
 from pydantic import BaseModel, Field
 from typing import List, Optional, Dict
 import uuid
+import zlib
 from datetime import datetime, date, timezone, timedelta
 import bcrypt
+import asyncio
+import base64
+import bisect
+import hashlib
+import heapq
+import hmac
+import itertools
+import json
+import re
+import secrets
+import time
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
@@ -22,6 +36,18 @@ if not mongo_url or not db_name:
 client = AsyncIOMotorClient(mongo_url)
 db = client[db_name]
 
+# Token signing configuration
+auth_secret = os.environ.get('AUTH_SECRET')
+if not auth_secret:
+    # Tokens signed with a per-process secret do not survive restarts or
+    # work across multiple workers, so AUTH_SECRET should be set in production.
+    auth_secret = secrets.token_urlsafe(32)
+    logging.warning("AUTH_SECRET not set; using a random per-process signing secret")
+AUTH_KEY = auth_secret.encode()
+ACCESS_TOKEN_TTL = int(os.environ.get('ACCESS_TOKEN_TTL_SECONDS', 15 * 60))
+REFRESH_TOKEN_TTL = int(os.environ.get('REFRESH_TOKEN_TTL_SECONDS', 7 * 24 * 60 * 60))
+REVOCATION_SYNC_INTERVAL = int(os.environ.get('REVOCATION_SYNC_SECONDS', 30))
+
 # Create the main app
 app = FastAPI()
 
@@ -58,6 +84,19 @@ class TeacherLogin(BaseModel):
     teacher_id: str
     password: str
 
+class RefreshRequest(BaseModel):
+    refresh_token: str
+
+class Device(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    device_id: str
+    name: str
+    created_by: str
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+class DeviceCreate(BaseModel):
+    name: str
+
 class Student(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     student_id: str
@@ -65,6 +104,14 @@ class Student(BaseModel):
     image_path: Optional[str] = None
     class_name: str = "Class 5"
 
+class StudentSearchResult(BaseModel):
+    id: str
+    student_id: str
+    name: str
+    image_path: Optional[str]
+    class_name: str
+    score: float
+
 class AttendanceRecord(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     student_id: str
@@ -91,6 +138,14 @@ class StudentWithAttendance(BaseModel):
     monthly_percentage: float
     overall_percentage: float
 
+class WatchlistEntry(BaseModel):
+    student_id: str
+    name: str
+    class_name: str
+    monthly_percentage: float
+    overall_percentage: float
+    reasons: List[str]  # "monthly" and/or "overall"
+
 class StudentStatus(BaseModel):
     id: str
     student_id: str
@@ -111,6 +166,684 @@ def verify_password(password: str, hashed: str) -> bool:
     except Exception:
         return False
 
+# Signed tokens
+#
+# Tokens are "<base64url payload>.<base64url HMAC-SHA256 signature>" and are
+# verified without touching the database. Revoked token ids (and revoked
+# device ids) live in the db.revoked_tokens collection and are mirrored into
+# revoked_ids, which a background task refreshes every REVOCATION_SYNC_INTERVAL.
+revoked_ids = set()
+
+def _b64encode(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+def _sign(message: bytes) -> bytes:
+    return hmac.new(AUTH_KEY, message, hashlib.sha256).digest()
+
+def create_token(teacher_id: str, name: str, token_type: str, ttl: int) -> str:
+    payload = {
+        "sub": teacher_id,
+        "name": name,
+        "typ": token_type,
+        "jti": uuid.uuid4().hex,
+        "exp": int(time.time()) + ttl
+    }
+    body = _b64encode(json.dumps(payload, separators=(",", ":")).encode())
+    return f"{body}.{_b64encode(_sign(body.encode()))}"
+
+def decode_token(token: str, token_type: str) -> dict:
+    try:
+        body, signature = token.split(".")
+        if not hmac.compare_digest(_b64decode(signature), _sign(body.encode())):
+            raise ValueError("bad signature")
+        payload = json.loads(_b64decode(body))
+    except Exception:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    if payload.get("typ") != token_type:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    if payload["exp"] < time.time():
+        raise HTTPException(status_code=401, detail="Token expired")
+    if payload["jti"] in revoked_ids:
+        raise HTTPException(status_code=401, detail="Token revoked")
+    return payload
+
+def issue_token_pair(teacher_id: str, name: str) -> dict:
+    return {
+        "access_token": create_token(teacher_id, name, "access", ACCESS_TOKEN_TTL),
+        "refresh_token": create_token(teacher_id, name, "refresh", REFRESH_TOKEN_TTL),
+        "token_type": "bearer",
+        "expires_in": ACCESS_TOKEN_TTL
+    }
+
+def create_device_key(device_id: str) -> str:
+    signature = _sign(f"device:{device_id}".encode())
+    return f"{device_id}.{_b64encode(signature)}"
+
+async def revoke(revoked_id: str, expires_at: Optional[datetime] = None) -> bool:
+    """Revoke a token id or device id. A None expiry revokes it permanently.
+    Returns False if it was already revoked (jti is unique in db.revoked_tokens)."""
+    revoked_ids.add(revoked_id)
+    try:
+        await db.revoked_tokens.insert_one({"jti": revoked_id, "expires_at": expires_at})
+    except DuplicateKeyError:
+        return False
+    return True
+
+async def init_revocation_indexes():
+    await db.revoked_tokens.create_index("jti", unique=True)
+    # Expired rows drop out on their own; permanent (None) revocations are never removed
+    await db.revoked_tokens.create_index("expires_at", expireAfterSeconds=0)
+
+async def sync_revocations():
+    """Reload the in-memory revocation set from the database"""
+    global revoked_ids
+    now = datetime.now(timezone.utc)
+    known = set(revoked_ids)
+    records = await db.revoked_tokens.find(
+        {"$or": [{"expires_at": None}, {"expires_at": {"$gt": now}}]},
+        {"jti": 1}
+    ).to_list(None)
+    # Keep anything revoke() added while the query was in flight
+    revoked_ids = {record["jti"] for record in records} | (revoked_ids - known)
+
+async def revocation_sync_loop():
+    while True:
+        await asyncio.sleep(REVOCATION_SYNC_INTERVAL)
+        try:
+            await sync_revocations()
+        except Exception as e:
+            logging.error(f"Error syncing token revocations: {e}")
+
+# Auth dependencies
+async def get_current_teacher(authorization: Optional[str] = Header(None)) -> dict:
+    if not authorization or not authorization.startswith("Bearer "):
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    return decode_token(authorization[7:], "access")
+
+async def get_current_device(x_api_key: Optional[str] = Header(None)) -> str:
+    if not x_api_key:
+        raise HTTPException(status_code=401, detail="Missing API key")
+    device_id, _, signature = x_api_key.rpartition(".")
+    try:
+        valid = hmac.compare_digest(_b64decode(signature), _sign(f"device:{device_id}".encode()))
+    except Exception:
+        valid = False
+    if not device_id or not valid or f"device:{device_id}" in revoked_ids:
+        raise HTTPException(status_code=401, detail="Invalid API key")
+    return device_id
+
+# Student search index
+#
+# Held in process memory so name lookups never scan db.students. Name words go
+# into a character trie whose nodes hold the ids of every student with a word
+# under that prefix, plus the first SEARCH_TOP_K of them in name order so broad
+# prefixes ("s", "singh") can be answered without ranking thousands of matches.
+# student_ids live in a sorted list and are prefix-matched with bisect. Typos
+# fall back to trigram candidates over the distinct name words, confirmed with
+# a bounded edit distance.
+SEARCH_TOP_K = 50
+SEARCH_RANK_LIMIT = 1000  # larger candidate sets are ranked from the top-K lists
+
+def _trigrams(token: str) -> set:
+    padded = f"  {token} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+def _edit_distance(a: str, b: str, limit: int) -> int:
+    """Levenshtein distance, giving up (returning limit + 1) once it exceeds limit"""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (char_a != char_b)
+            ))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+class StudentSearchIndex:
+    def __init__(self):
+        self.students = {}        # student_id -> slim student document
+        self.words = {}           # student_id -> lowercased name words
+        self.word_ids = {}        # name word -> student_ids having it
+        self.trigram_words = {}   # trigram -> name words containing it
+        self.sorted_ids = []      # sorted (lowercased student_id, student_id)
+        self.trie = self._node()
+
+    @staticmethod
+    def _node() -> dict:
+        # "top" heads every student under this prefix, "word_top" only those whose word ends here
+        return {"ids": set(), "top": [], "word_top": [], "children": {}}
+
+    @staticmethod
+    def _add_top(top: list, key: tuple):
+        if len(top) < SEARCH_TOP_K or key < top[-1]:
+            bisect.insort(top, key)
+            del top[SEARCH_TOP_K:]
+
+    def _remove_top(self, node: dict, field: str, key: tuple, ids):
+        """Drop key from node[field], refilling it from ids if it was truncated"""
+        top = node[field]
+        position = bisect.bisect_left(top, key)
+        if position < len(top) and top[position] == key:
+            del top[position]
+            if len(ids) > len(top):
+                node[field] = heapq.nsmallest(SEARCH_TOP_K, (self._sort_key(sid) for sid in ids))
+
+    @staticmethod
+    def tokenize(text: str) -> List[str]:
+        return re.findall(r"[a-z0-9]+", text.lower())
+
+    def _sort_key(self, student_id: str) -> tuple:
+        return (self.students[student_id]["name"].lower(), student_id)
+
+    def _word_nodes(self, words, create: bool = False) -> Dict[str, tuple]:
+        """Distinct trie nodes on the paths of words, keyed by prefix, as (parent, node).
+        Words sharing a prefix ("sam", "sid") share nodes, which must be updated once."""
+        nodes = {}
+        for word in words:
+            node = self.trie
+            for i, char in enumerate(word):
+                prefix = word[:i + 1]
+                if prefix not in nodes:
+                    children = node["children"]
+                    nodes[prefix] = (node, children.setdefault(char, self._node()) if create else children[char])
+                node = nodes[prefix][1]
+        return nodes
+
+    def add(self, student: dict):
+        student_id = student["student_id"]
+        if student_id in self.students:
+            self.remove(student_id)
+        self.students[student_id] = {
+            "id": student["id"],
+            "student_id": student_id,
+            "name": student["name"],
+            "image_path": student.get("image_path"),
+            "class_name": student.get("class_name", "Class 5")
+        }
+        bisect.insort(self.sorted_ids, (student_id.lower(), student_id))
+        key = self._sort_key(student_id)
+        words = set(self.tokenize(student["name"]))
+        self.words[student_id] = words
+        for word in words:
+            if word not in self.word_ids:
+                self.word_ids[word] = set()
+                for gram in _trigrams(word):
+                    self.trigram_words.setdefault(gram, set()).add(word)
+            self.word_ids[word].add(student_id)
+        nodes = self._word_nodes(words, create=True)
+        for _, node in nodes.values():
+            node["ids"].add(student_id)
+            self._add_top(node["top"], key)
+        for word in words:
+            self._add_top(nodes[word][1]["word_top"], key)
+
+    def remove(self, student_id: str):
+        if student_id not in self.students:
+            return
+        key = self._sort_key(student_id)
+        del self.students[student_id]
+        del self.sorted_ids[bisect.bisect_left(self.sorted_ids, (student_id.lower(), student_id))]
+        words = self.words.pop(student_id)
+        for word in words:
+            self.word_ids[word].discard(student_id)
+            if not self.word_ids[word]:
+                del self.word_ids[word]
+                for gram in _trigrams(word):
+                    self.trigram_words[gram].discard(word)
+        nodes = self._word_nodes(words)
+        for word in words:
+            self._remove_top(nodes[word][1], "word_top", key, self.word_ids.get(word, ()))
+        # Deepest first, so a node is pruned before its parent is looked at
+        for prefix in sorted(nodes, key=len, reverse=True):
+            parent, node = nodes[prefix]
+            node["ids"].discard(student_id)
+            if not node["ids"]:
+                del parent["children"][prefix[-1]]
+            else:
+                self._remove_top(node, "top", key, node["ids"])
+
+    def _fuzzy_words(self, term: str) -> Dict[str, float]:
+        """Score name words within a small edit distance of term (or of its prefix)"""
+        limit = 1 if len(term) <= 5 else 2
+        grams = _trigrams(term)
+        overlap = {}
+        for gram in grams:
+            for word in self.trigram_words.get(gram, ()):
+                overlap[word] = overlap.get(word, 0) + 1
+        # A single edit changes at most three trigrams
+        min_shared = max(1, len(grams) - 3 * limit)
+        scores = {}
+        for word, shared in overlap.items():
+            if shared < min_shared:
+                continue
+            distance = min(
+                _edit_distance(term, word, limit),
+                _edit_distance(term, word[:len(term)], limit)
+            )
+            if distance <= limit:
+                scores[word] = 1 - distance / (limit + 1)
+        return scores
+
+    def _match_term(self, term: str, limit: int) -> dict:
+        node = self.trie
+        for char in term:
+            node = node["children"].get(char)
+            if node is None:
+                node = self._node()
+                break
+        lo = bisect.bisect_left(self.sorted_ids, (term,))
+        hi = bisect.bisect_left(self.sorted_ids, (term + "\uffff",))
+        match = {"term": term, "node": node, "lo": lo, "hi": hi, "fuzzy": {}, "fuzzy_nodes": []}
+        if len(term) >= 3 and len(node["ids"]) + hi - lo < limit:
+            match["fuzzy"] = self._fuzzy_words(term)
+            for word in match["fuzzy"]:
+                fuzzy_node = self.trie
+                for char in word:
+                    fuzzy_node = fuzzy_node["children"][char]
+                match["fuzzy_nodes"].append(fuzzy_node)
+        if hi - lo > SEARCH_RANK_LIMIT:
+            match["ids"] = None
+        elif lo == hi and not match["fuzzy"]:
+            match["ids"] = node["ids"]
+        else:
+            match["ids"] = node["ids"].union(
+                (sid for _, sid in self.sorted_ids[lo:hi]),
+                *(fuzzy_node["ids"] for fuzzy_node in match["fuzzy_nodes"])
+            )
+        return match
+
+    def _score(self, student_id: str, match: dict) -> float:
+        term = match["term"]
+        lowered = student_id.lower()
+        if lowered == term:
+            return 3.0
+        best = 2.0 if lowered.startswith(term) else 0.0
+        for word in self.words[student_id]:
+            if word == term:
+                return 3.0
+            if word.startswith(term):
+                best = 2.0
+            elif best < 1:
+                best = max(best, match["fuzzy"].get(word, 0.0))
+        return best
+
+    def search(self, query: str, limit: int = 10) -> List[dict]:
+        terms = self.tokenize(query)
+        if not terms:
+            return []
+        matches = [self._match_term(term, limit) for term in terms]
+        # Intersect the materialised candidate sets, smallest first
+        sets = sorted((m["ids"] for m in matches if m["ids"] is not None), key=len)
+        candidates = None
+        if sets:
+            candidates = sets[0]
+            for ids in sets[1:]:
+                candidates = candidates & ids
+                if not candidates:
+                    return []
+        if candidates is None or len(candidates) > SEARCH_RANK_LIMIT:
+            # Too broad to rank exhaustively: rank the name-ordered heads of each term
+            pool = set()
+            for m in matches:
+                # Exact word matches outrank prefix matches, so their head must be in the pool too
+                pool.update(sid for _, sid in m["node"]["word_top"])
+                pool.update(sid for _, sid in m["node"]["top"])
+                pool.update(sid for _, sid in self.sorted_ids[m["lo"]:min(m["hi"], m["lo"] + SEARCH_TOP_K)])
+                for fuzzy_node in m["fuzzy_nodes"]:
+                    pool.update(sid for _, sid in fuzzy_node["top"])
+            if candidates is not None:
+                pool &= candidates
+                if len(pool) < limit:
+                    pool.update(itertools.islice(candidates, limit))
+            candidates = pool
+        ranked = []
+        for sid in candidates:
+            total = 0.0
+            for m in matches:
+                score = self._score(sid, m)
+                if not score:
+                    break
+                total += score
+            else:
+                ranked.append((-total, self._sort_key(sid), sid))
+        return [
+            {**self.students[sid], "score": round(-negative_total, 2)}
+            for negative_total, _, sid in heapq.nsmallest(limit, ranked)
+        ]
+
+student_index = StudentSearchIndex()
+
+async def build_student_index():
+    async for student in db.students.find():
+        student_index.add(student)
+    logging.info(f"Student search index built with {len(student_index.students)} students")
+
+# Academic-year archive
+#
+# Once an academic year has closed, its records are moved out of db.attendance
+# so the hot collection only ever holds the current year. Each student/year
+# becomes one db.attendance_archive summary whose "days" string has one char per
+# day of the year ("P" present, "A" absent, "-" no record), which is enough to
+# answer every read path. The original records are kept zlib-compressed in
+# db.attendance_archive_raw.
+ACADEMIC_YEAR_START_MONTH = int(os.environ.get('ACADEMIC_YEAR_START_MONTH', 4))
+ARCHIVE_INTERVAL = int(os.environ.get('ARCHIVE_INTERVAL_SECONDS', 24 * 60 * 60))
+ARCHIVE_DAY_CODES = {"present": "P", "absent": "A"}
+
+def academic_year_start(day: date) -> date:
+    year = day.year if day.month >= ACADEMIC_YEAR_START_MONTH else day.year - 1
+    return date(year, ACADEMIC_YEAR_START_MONTH, 1)
+
+def archived_status(summaries: Dict[int, dict], day: date) -> Optional[str]:
+    """Status archived for day, given a student's summaries keyed by academic year"""
+    year_start = academic_year_start(day)
+    summary = summaries.get(year_start.year)
+    if not summary:
+        return None
+    code = summary["days"][(day - year_start).days]
+    return "present" if code == "P" else "absent" if code == "A" else None
+
+def merge_archived_totals(hot_records: List[dict], summaries: Dict[int, dict]) -> tuple:
+    """(present, total) across hot records and archived years, without counting a day twice"""
+    present = sum(s["present"] for s in summaries.values())
+    total = sum(s["total"] for s in summaries.values())
+    for record in hot_records:
+        if summaries:
+            # A late write to an already archived day replaces the archived status
+            previous = archived_status(summaries, record["date"].date())
+            if previous:
+                present -= previous == "present"
+                total -= 1
+        present += record["status"] == "present"
+        total += 1
+    return present, total
+
+async def get_archive_summaries(student_ids: List[str]) -> Dict[str, Dict[int, dict]]:
+    summaries = {}
+    async for summary in db.attendance_archive.find({"student_id": {"$in": student_ids}}):
+        summaries.setdefault(summary["student_id"], {})[summary["academic_year"]] = summary
+    return summaries
+
+def decompress_archived_records(raw_document: dict) -> List[dict]:
+    return json.loads(zlib.decompress(raw_document["records"]))
+
+async def get_archived_records(student_id: str, academic_year: Optional[int] = None) -> List[dict]:
+    """Original records of a student's archived years, shaped like parse_from_mongo output"""
+    query = {"student_id": student_id}
+    if academic_year is not None:
+        query["academic_year"] = academic_year
+    records = []
+    async for raw_document in db.attendance_archive_raw.find(query):
+        for record in decompress_archived_records(raw_document):
+            records.append({
+                "id": record["id"],
+                "student_id": student_id,
+                "date": date.fromisoformat(record["date"]),
+                "status": record["status"],
+                "marked_by": record["marked_by"],
+                "timestamp": datetime.fromisoformat(record["timestamp"]) if record["timestamp"] else None
+            })
+    return records
+
+async def get_archived_status(student_id: str, day: date) -> Optional[str]:
+    """Status archived for one student/day; days in the current academic year are never archived"""
+    year_start = academic_year_start(day)
+    if year_start >= academic_year_start(date.today()):
+        return None
+    summary = await db.attendance_archive.find_one({"student_id": student_id, "academic_year": year_start.year})
+    return archived_status({year_start.year: summary}, day) if summary else None
+
+async def archive_student_year(student_id: str, year_start: date, records: List[dict]):
+    query = {"student_id": student_id, "academic_year": year_start.year}
+    existing = await db.attendance_archive.find_one(query)
+    days = list(existing["days"]) if existing else ["-"] * 366
+    for record in records:
+        days[(record["date"].date() - year_start).days] = ARCHIVE_DAY_CODES.get(record["status"], "A")
+    days = "".join(days)
+    await db.attendance_archive.replace_one(
+        query,
+        {
+            **query,
+            "start_date": datetime.combine(year_start, datetime.min.time()),
+            "days": days,
+            "present": days.count("P"),
+            "total": days.count("P") + days.count("A")
+        },
+        upsert=True
+    )
+    # One raw document per student/year, merged by date like the summary, so a rerun
+    # after a failed delete rewrites the same records instead of adding copies
+    existing_raw = await db.attendance_archive_raw.find_one(query)
+    raw = {r["date"]: r for r in decompress_archived_records(existing_raw)} if existing_raw else {}
+    for record in records:
+        day = record["date"].date().isoformat()
+        raw[day] = {
+            "id": record.get("id"),
+            "date": day,
+            "status": record["status"],
+            "marked_by": record.get("marked_by", "manual"),
+            "timestamp": record["timestamp"].isoformat() if isinstance(record.get("timestamp"), datetime) else None
+        }
+    await db.attendance_archive_raw.replace_one(
+        query,
+        {
+            **query,
+            "count": len(raw),
+            "records": zlib.compress(json.dumps([raw[day] for day in sorted(raw)], separators=(",", ":")).encode()),
+            "archived_at": datetime.now(timezone.utc)
+        },
+        upsert=True
+    )
+
+async def archive_closed_years() -> int:
+    """Move records from closed academic years into the archive. Returns the number moved."""
+    cutoff = datetime.combine(academic_year_start(date.today()), datetime.min.time())
+    archived = 0
+    # One student at a time keeps memory bounded however much history there is
+    for student_id in await db.attendance.distinct("student_id", {"date": {"$lt": cutoff}}):
+        records = await db.attendance.find({"student_id": student_id, "date": {"$lt": cutoff}}).to_list(None)
+        by_year = {}
+        for record in records:
+            by_year.setdefault(academic_year_start(record["date"].date()), []).append(record)
+        for year_start, year_records in sorted(by_year.items()):
+            await archive_student_year(student_id, year_start, year_records)
+        # Delete only after the archive writes succeed; a rerun overwrites the same days.
+        # Match the per-write id, not _id: find_one_and_replace keeps _id, so a correction
+        # landing since the read must survive to be archived on the next run.
+        await db.attendance.delete_many({"id": {"$in": [record["id"] for record in records]}})
+        archived += len(records)
+    if archived:
+        logging.info(f"Archived {archived} attendance records from before {cutoff.date()}")
+    return archived
+
+async def archive_loop():
+    while True:
+        try:
+            await archive_closed_years()
+        except Exception as e:
+            logging.error(f"Error archiving attendance: {e}")
+        await asyncio.sleep(ARCHIVE_INTERVAL)
+
+# Low-attendance watchlist
+#
+# Kept up to date by every attendance write instead of being recomputed: each
+# write adjusts the student's overall present/total counts and their rolling
+# window of recent days, then re-checks just that student against the
+# thresholds. Students entering or leaving the watchlist produce crossing events
+# that are pushed to subscriber queues (see /api/watchlist/events).
+WATCHLIST_WINDOW_DAYS = 30
+WATCHLIST_MONTHLY_THRESHOLD = float(os.environ.get('WATCHLIST_MONTHLY_THRESHOLD', 75))
+WATCHLIST_OVERALL_THRESHOLD = float(os.environ.get('WATCHLIST_OVERALL_THRESHOLD', 75))
+
+class AttendanceWatchlist:
+    def __init__(self):
+        self.overall = {}    # student_id -> [present, total]
+        self.recent = {}     # student_id -> {date: present} within the window
+        self.flagged = {}    # student_id -> watchlist entry
+        self.window_start = date.today() - timedelta(days=WATCHLIST_WINDOW_DAYS)
+        self.subscribers = set()
+
+    def load(self, totals: List[dict], recent_records: List[dict]):
+        """Initialise from aggregated totals and the records inside the window, without emitting events"""
+        self.overall = {t["_id"]: [t["present"], t["total"]] for t in totals}
+        self.recent = {}
+        for record in recent_records:
+            day = record["date"].date() if isinstance(record["date"], datetime) else record["date"]
+            self.recent.setdefault(record["student_id"], {})[day] = record["status"] == "present"
+        self.flagged = {}
+        for student_id in set(self.overall) | set(self.recent):
+            entry = self._evaluate(student_id)
+            if entry:
+                self.flagged[student_id] = entry
+
+    def record(self, student_id: str, day: date, status: str, previous_status: Optional[str] = None):
+        """Apply one attendance write. previous_status is the status it replaced, if any."""
+        self.advance_window()
+        present = status == "present"
+        counts = self.overall.setdefault(student_id, [0, 0])
+        if previous_status is None:
+            counts[1] += 1
+        else:
+            counts[0] -= previous_status == "present"
+        counts[0] += present
+        if day >= self.window_start:
+            self.recent.setdefault(student_id, {})[day] = present
+        self._update(student_id)
+
+    def advance_window(self):
+        """Slide the rolling window to today, re-checking students whose recent days expired"""
+        window_start = date.today() - timedelta(days=WATCHLIST_WINDOW_DAYS)
+        if window_start == self.window_start:
+            return
+        self.window_start = window_start
+        for student_id, days in list(self.recent.items()):
+            expired = [day for day in days if day < window_start]
+            if expired:
+                for day in expired:
+                    del days[day]
+                self._update(student_id)
+
+    def _evaluate(self, student_id: str) -> Optional[dict]:
+        present, total = self.overall.get(student_id, (0, 0))
+        days = self.recent.get(student_id, {})
+        overall_percentage = present / total * 100 if total else None
+        monthly_percentage = sum(days.values()) / len(days) * 100 if days else None
+        reasons = []
+        if monthly_percentage is not None and monthly_percentage < WATCHLIST_MONTHLY_THRESHOLD:
+            reasons.append("monthly")
+        if overall_percentage is not None and overall_percentage < WATCHLIST_OVERALL_THRESHOLD:
+            reasons.append("overall")
+        if not reasons:
+            return None
+        return {
+            "student_id": student_id,
+            "monthly_percentage": round(monthly_percentage or 0, 1),
+            "overall_percentage": round(overall_percentage or 0, 1),
+            "reasons": reasons
+        }
+
+    def _update(self, student_id: str):
+        entry = self._evaluate(student_id)
+        was_flagged = student_id in self.flagged
+        if entry:
+            self.flagged[student_id] = entry
+            if not was_flagged:
+                self._emit("entered", entry)
+        elif was_flagged:
+            previous = self.flagged.pop(student_id)
+            present, total = self.overall.get(student_id, (0, 0))
+            days = self.recent.get(student_id, {})
+            self._emit("left", {
+                "student_id": student_id,
+                "monthly_percentage": round(sum(days.values()) / len(days) * 100, 1) if days else 0,
+                "overall_percentage": round(present / total * 100, 1) if total else 0,
+                "reasons": previous["reasons"]
+            })
+
+    def _emit(self, event_type: str, entry: dict):
+        event = {"type": event_type, "timestamp": datetime.now(timezone.utc).isoformat(), **entry}
+        for queue in self.subscribers:
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                logging.warning("Dropping watchlist event for a slow subscriber")
+
+    def subscribe(self) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=1000)
+        self.subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self.subscribers.discard(queue)
+
+watchlist = AttendanceWatchlist()
+
+async def build_watchlist():
+    window_start = datetime.combine(watchlist.window_start, datetime.min.time())
+    totals = await db.attendance.aggregate([
+        {"$group": {
+            "_id": "$student_id",
+            "present": {"$sum": {"$cond": [{"$eq": ["$status", "present"]}, 1, 0]}},
+            "total": {"$sum": 1}
+        }}
+    ]).to_list(None)
+    archived_totals = await db.attendance_archive.aggregate([
+        {"$group": {"_id": "$student_id", "present": {"$sum": "$present"}, "total": {"$sum": "$total"}}}
+    ]).to_list(None)
+    merged = {t["_id"]: dict(t) for t in archived_totals}
+    for t in totals:
+        merged.setdefault(t["_id"], {"_id": t["_id"], "present": 0, "total": 0})
+        merged[t["_id"]]["present"] += t["present"]
+        merged[t["_id"]]["total"] += t["total"]
+    # Late writes to archived days are counted by both; the hot record wins
+    cutoff = datetime.combine(academic_year_start(date.today()), datetime.min.time())
+    late_records = await db.attendance.find(
+        {"date": {"$lt": cutoff}},
+        {"student_id": 1, "date": 1, "status": 1}
+    ).to_list(None)
+    if late_records:
+        archive = await get_archive_summaries(list({r["student_id"] for r in late_records}))
+        for record in late_records:
+            previous = archived_status(archive.get(record["student_id"], {}), record["date"].date())
+            if previous:
+                merged[record["student_id"]]["present"] -= previous == "present"
+                merged[record["student_id"]]["total"] -= 1
+    recent_records = await db.attendance.find(
+        {"date": {"$gte": window_start}},
+        {"student_id": 1, "date": 1, "status": 1}
+    ).to_list(None)
+    # Early in an academic year the window reaches back into the archived one
+    archived_records = []
+    archived_year_start = academic_year_start(watchlist.window_start)
+    if archived_year_start < academic_year_start(date.today()):
+        async for summary in db.attendance_archive.find({"academic_year": archived_year_start.year}):
+            summaries = {summary["academic_year"]: summary}
+            day = watchlist.window_start
+            while academic_year_start(day) == archived_year_start:
+                status = archived_status(summaries, day)
+                if status:
+                    archived_records.append({"student_id": summary["student_id"], "date": day, "status": status})
+                day += timedelta(days=1)
+    # Hot records come last so a late write overrides the archived day
+    watchlist.load(list(merged.values()), archived_records + recent_records)
+    logging.info(f"Attendance watchlist built with {len(watchlist.flagged)} students below threshold")
+
+async def watchlist_window_loop():
+    # Days also leave the rolling window when nobody is writing attendance
+    while True:
+        await asyncio.sleep(60 * 60)
+        watchlist.advance_window()
+
 # Initialize default teacher
 async def init_default_teacher():
     existing_teacher = await db.teachers.find_one({"teacher_id": "Ramandeep@singh"})
@@ -137,6 +870,7 @@ async def init_sample_students():
         if not existing:
             student = Student(**student_data)
             await db.students.insert_one(student.model_dump())
+            student_index.add(student.model_dump())
     
     # Initialize sample attendance data for the past 30 days
     import random
@@ -170,35 +904,112 @@ async def login(login_data: TeacherLogin):
     if not teacher or not verify_password(login_data.password, teacher["password_hash"]):
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
-    return {"success": True, "teacher_id": teacher["teacher_id"], "name": teacher["name"]}
+    return {
+        "success": True,
+        "teacher_id": teacher["teacher_id"],
+        "name": teacher["name"],
+        **issue_token_pair(teacher["teacher_id"], teacher["name"])
+    }
+
+@api_router.post("/token/refresh")
+async def refresh_token(refresh_data: RefreshRequest):
+    payload = decode_token(refresh_data.refresh_token, "refresh")
+    # Refresh tokens are single use: claim this one before any await so a concurrent
+    # refresh in this worker fails decode_token, and the unique jti insert stops other workers
+    revoked_ids.add(payload["jti"])
+    if not await revoke(payload["jti"], datetime.fromtimestamp(payload["exp"], timezone.utc)):
+        raise HTTPException(status_code=401, detail="Token revoked")
+    teacher = await db.teachers.find_one({"teacher_id": payload["sub"]})
+    if not teacher:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    return issue_token_pair(teacher["teacher_id"], teacher["name"])
+
+@api_router.post("/logout")
+async def logout(refresh_data: RefreshRequest, authorization: Optional[str] = Header(None)):
+    """Revoke the refresh token, and the access token too if one is sent and still valid.
+    Works with an expired access token so logging out always ends the session."""
+    tokens = [(refresh_data.refresh_token, "refresh")]
+    if authorization and authorization.startswith("Bearer "):
+        tokens.append((authorization[7:], "access"))
+    for token, token_type in tokens:
+        try:
+            payload = decode_token(token, token_type)
+        except HTTPException:
+            continue
+        await revoke(payload["jti"], datetime.fromtimestamp(payload["exp"], timezone.utc))
+    return {"success": True}
+
+@api_router.post("/devices")
+async def create_device(device_data: DeviceCreate, teacher: dict = Depends(get_current_teacher)):
+    """Register a face recognition device and issue its API key (shown only once)"""
+    device = Device(device_id=uuid.uuid4().hex, name=device_data.name, created_by=teacher["sub"])
+    await db.devices.insert_one(device.model_dump())
+    return {"device_id": device.device_id, "name": device.name, "api_key": create_device_key(device.device_id)}
 
-@api_router.get("/students", response_model=List[Student])
+@api_router.get("/devices", response_model=List[Device], dependencies=[Depends(get_current_teacher)])
+async def get_devices():
+    devices = await db.devices.find().to_list(100)
+    return [Device(**device) for device in devices]
+
+@api_router.delete("/devices/{device_id}", dependencies=[Depends(get_current_teacher)])
+async def revoke_device(device_id: str):
+    result = await db.devices.delete_one({"device_id": device_id})
+    if result.deleted_count == 0:
+        raise HTTPException(status_code=404, detail="Device not found")
+    await revoke(f"device:{device_id}")
+    return {"success": True, "message": f"API key revoked for device {device_id}"}
+
+@api_router.get("/students", response_model=List[Student], dependencies=[Depends(get_current_teacher)])
 async def get_students():
     students = await db.students.find().to_list(100)
     return [Student(**student) for student in students]
 
-@api_router.get("/students/{student_id}/attendance")
+@api_router.get("/students/search", response_model=List[StudentSearchResult], dependencies=[Depends(get_current_teacher)])
+async def search_students(q: str, limit: int = 10):
+    """Rank students by prefix/fuzzy match of q against name words and student_id"""
+    return [StudentSearchResult(**student) for student in student_index.search(q, min(max(limit, 1), 50))]
+
+@api_router.get("/students/{student_id}/attendance", dependencies=[Depends(get_current_teacher)])
 async def get_student_attendance(student_id: str, date_filter: Optional[str] = None):
+    """Attendance records for a student, including archived academic years.
+    Without date_filter this returns the 100 most recent days."""
     query = {"student_id": student_id}
     if date_filter:
         query["date"] = datetime.fromisoformat(date_filter)
     
-    attendance_records = await db.attendance.find(query).to_list(100)
-    return [parse_from_mongo(record) for record in attendance_records]
+    attendance_records = [parse_from_mongo(record) for record in await db.attendance.find(query).to_list(100)]
+    current_year_start = academic_year_start(date.today())
+    if date_filter:
+        day = query["date"].date()
+        if attendance_records or academic_year_start(day) >= current_year_start:
+            return attendance_records
+        archived = await get_archived_records(student_id, academic_year_start(day).year)
+        return [record for record in archived if record["date"] == day]
+    
+    # Hot records win over archived ones for the same day (late writes)
+    hot_dates = {record["date"] for record in attendance_records}
+    archived = [r for r in await get_archived_records(student_id) if r["date"] not in hot_dates]
+    return sorted(archived + attendance_records, key=lambda record: record["date"])[-100:]
 
-@api_router.get("/attendance/{date_str}")
+@api_router.get("/attendance/{date_str}", dependencies=[Depends(get_current_teacher)])
 async def get_attendance_by_date(date_str: str):
     students = await db.students.find().to_list(100)
     result = []
     date_obj = datetime.fromisoformat(date_str)
     month_ago = date_obj - timedelta(days=30)
+    archive = await get_archive_summaries([student["student_id"] for student in students])
     
     for student in students:
+        summaries = archive.get(student["student_id"], {})
+        
         # Get attendance for specific date
         attendance = await db.attendance.find_one({
             "student_id": student["student_id"],
             "date": date_obj
         })
+        if not attendance and summaries:
+            status = archived_status(summaries, date_obj.date())
+            attendance = {"status": status} if status else None
         
         # Monthly percentage (last 30 days)
         monthly_records = await db.attendance.find({
@@ -208,14 +1019,21 @@ async def get_attendance_by_date(date_str: str):
         
         monthly_present = len([r for r in monthly_records if r["status"] == "present"])
         monthly_total = len(monthly_records)
+        if summaries:
+            hot_days = {r["date"].date() for r in monthly_records}
+            for offset in range(31):
+                day = (month_ago + timedelta(days=offset)).date()
+                status = None if day in hot_days else archived_status(summaries, day)
+                if status:
+                    monthly_present += status == "present"
+                    monthly_total += 1
         monthly_percentage = (monthly_present / monthly_total * 100) if monthly_total > 0 else 0
         
-        # Overall percentage (all time)
+        # Overall percentage (all time, including archived years)
         overall_records = await db.attendance.find({
             "student_id": student["student_id"]
         }).to_list(1000)
-        overall_present = len([r for r in overall_records if r["status"] == "present"])
-        overall_total = len(overall_records)
+        overall_present, overall_total = merge_archived_totals(overall_records, summaries)
         overall_percentage = (overall_present / overall_total * 100) if overall_total > 0 else 0
         
         student_attendance = StudentWithAttendance(
@@ -232,7 +1050,7 @@ async def get_attendance_by_date(date_str: str):
     
     return result
 
-@api_router.post("/attendance")
+@api_router.post("/attendance", dependencies=[Depends(get_current_teacher)])
 async def mark_attendance(attendance_data: AttendanceUpdate):
     try:
         for record in attendance_data.attendance_records:
@@ -243,26 +1061,30 @@ async def mark_attendance(attendance_data: AttendanceUpdate):
                 status=record.status
             )
             record_dict = prepare_for_mongo(new_record.model_dump())
-            await db.attendance.replace_one(
+            previous = await db.attendance.find_one_and_replace(
                 {"student_id": record.student_id, "date": date_obj},
                 record_dict,
+                projection={"status": 1},
                 upsert=True
             )
+            previous_status = previous["status"] if previous else await get_archived_status(record.student_id, date_obj.date())
+            watchlist.record(record.student_id, date_obj.date(), record.status, previous_status)
         return {"success": True, "message": f"Updated attendance for {len(attendance_data.attendance_records)} students"}
     except Exception as e:
         logging.error(f"Error marking attendance: {e}")
         raise HTTPException(status_code=500, detail="Failed to mark attendance")
 
-@api_router.get("/student-status/{student_id}")
+@api_router.get("/student-status/{student_id}", dependencies=[Depends(get_current_teacher)])
 async def get_student_status(student_id: str):
     student = await db.students.find_one({"student_id": student_id})
     if not student:
         raise HTTPException(status_code=404, detail="Student not found")
     
-    # Get all attendance records
+    # Get all attendance records, plus summaries of archived academic years
     attendance_records = await db.attendance.find({"student_id": student_id}).to_list(1000)
+    summaries = (await get_archive_summaries([student_id])).get(student_id, {})
     
-    if not attendance_records:
+    if not attendance_records and not summaries:
         return StudentStatus(
             id=student["id"],
             student_id=student["student_id"],
@@ -273,11 +1095,18 @@ async def get_student_status(student_id: str):
             absent_dates=[]
         )
     
-    present_count = len([r for r in attendance_records if r["status"] == "present"])
-    total_count = len(attendance_records)
+    present_count, total_count = merge_archived_totals(attendance_records, summaries)
     overall_percentage = (present_count / total_count * 100) if total_count > 0 else 0
     
-    absent_dates = [r["date"].isoformat() if isinstance(r["date"], datetime) else str(r["date"]) for r in attendance_records if r["status"] == "absent"]
+    hot_dates = {r["date"] for r in attendance_records}
+    absent_dates = []
+    for academic_year in sorted(summaries):
+        summary = summaries[academic_year]
+        for offset, code in enumerate(summary["days"]):
+            archived_date = summary["start_date"] + timedelta(days=offset)
+            if code == "A" and archived_date not in hot_dates:
+                absent_dates.append(archived_date.isoformat())
+    absent_dates += [r["date"].isoformat() if isinstance(r["date"], datetime) else str(r["date"]) for r in attendance_records if r["status"] == "absent"]
     
     return StudentStatus(
         id=student["id"],
@@ -293,10 +1122,45 @@ async def get_student_status(student_id: str):
         absent_dates=absent_dates
     )
 
+@api_router.get("/watchlist", response_model=List[WatchlistEntry], dependencies=[Depends(get_current_teacher)])
+async def get_watchlist(class_name: Optional[str] = None):
+    """Students currently below the monthly or overall attendance threshold"""
+    watchlist.advance_window()
+    result = []
+    for entry in watchlist.flagged.values():
+        student = student_index.students.get(entry["student_id"])
+        if not student or (class_name and student["class_name"] != class_name):
+            continue
+        result.append(WatchlistEntry(name=student["name"], class_name=student["class_name"], **entry))
+    result.sort(key=lambda e: (e.class_name, min(e.monthly_percentage, e.overall_percentage)))
+    return result
+
+@api_router.get("/watchlist/events", dependencies=[Depends(get_current_teacher)])
+async def watchlist_events():
+    """Server-sent stream of "entered"/"left" events as students cross the thresholds"""
+    queue = watchlist.subscribe()
+
+    async def stream():
+        try:
+            while True:
+                event = await queue.get()
+                yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+        finally:
+            watchlist.unsubscribe(queue)
+
+    return StreamingResponse(stream(), media_type="text/event-stream")
+
+@api_router.post("/archive/run", dependencies=[Depends(get_current_teacher)])
+async def run_archive():
+    """Archive closed academic years now instead of waiting for the scheduled job"""
+    archived = await archive_closed_years()
+    return {"success": True, "message": f"Archived {archived} attendance records"}
+
 # External API for face recognition system
 @api_router.post("/external/mark-attendance")
-async def external_mark_attendance(student_id: str, status: str = "present"):
-    """API endpoint for external face recognition system to mark attendance"""
+async def external_mark_attendance(student_id: str, status: str = "present", device_id: str = Depends(get_current_device)):
+    """API endpoint for external face recognition system to mark attendance.
+    Requires a per-device key in the X-API-Key header (see POST /api/devices)."""
     try:
         today = datetime.combine(date.today(), datetime.min.time())
         record = AttendanceRecord(
@@ -306,11 +1170,14 @@ async def external_mark_attendance(student_id: str, status: str = "present"):
             marked_by="face_recognition"
         )
         record_dict = prepare_for_mongo(record.dict())
-        await db.attendance.replace_one(
+        previous = await db.attendance.find_one_and_replace(
             {"student_id": student_id, "date": today},
             record_dict,
+            projection={"status": 1},
             upsert=True
         )
+        previous_status = previous["status"] if previous else await get_archived_status(student_id, today.date())
+        watchlist.record(student_id, today.date(), status, previous_status)
         return {"success": True, "message": f"Attendance marked for {student_id}"}
     except Exception as e:
         logging.error(f"Error in external mark attendance: {e}")
@@ -341,5 +1208,14 @@ async def shutdown_db_client():
 @app.on_event("startup")
 async def lifespan():
     await init_default_teacher()
+    await build_student_index()
     await init_sample_students()
+    await db.attendance_archive.create_index([("student_id", 1), ("academic_year", 1)], unique=True)
+    await db.attendance_archive_raw.create_index([("student_id", 1), ("academic_year", 1)], unique=True)
+    await build_watchlist()
+    await init_revocation_indexes()
+    await sync_revocations()
+    asyncio.create_task(revocation_sync_loop())
+    asyncio.create_task(watchlist_window_loop())
+    asyncio.create_task(archive_loop())
     logger.info("Application startup complete")
\ No newline at end of file
@@ -13,6 +13,10 @@ load_dotenv()
 # API Configuration
 BACKEND_URL = os.environ.get('REACT_APP_BACKEND_URL', 'https://punjab-attendance.preview.emergentagent.com')
 API_BASE = f"{BACKEND_URL}/api"
+# Per-device key issued by POST /api/devices
+API_KEY = os.environ.get('ATTENDANCE_API_KEY', '')
+# Teacher access token (from POST /api/login), only needed for reading status
+ACCESS_TOKEN = os.environ.get('TEACHER_ACCESS_TOKEN', '')
 
 # Sample student IDs in the system
 STUDENT_IDS = ['STU001', 'STU002', 'STU003', 'STU004', 'STU005']
@@ -35,7 +39,9 @@ def mark_attendance_via_api(student_id, status='present'):
             'status': status
         }
         
-        response = requests.post(url, params=params)
+        headers = {'X-API-Key': API_KEY}
+        
+        response = requests.post(url, params=params, headers=headers)
         
         if response.status_code == 200:
             result = response.json()
@@ -64,7 +70,8 @@ def get_student_status(student_id):
     """
     try:
         url = f"{API_BASE}/student-status/{student_id}"
-        response = requests.get(url)
+        headers = {'Authorization': f"Bearer {ACCESS_TOKEN}"}
+        response = requests.get(url, headers=headers)
         
         if response.status_code == 200:
             return response.json()
@@ -100,6 +107,7 @@ if __name__ == "__main__":
     print("🔗 Integration Points:")
     print(f"   • API Endpoint: {API_BASE}/external/mark-attendance")
     print("   • Method: POST")
+    print("   • Header: X-API-Key (per-device key)")
     print("   • Parameters: student_id, status")
     print("   • Database: Shared MongoDB instance")
     print("   • Real-time: Changes reflect immediately in web interface")
@@ -110,6 +118,9 @@ To integrate with your face recognition system:
 1. Install required packages:
    pip install requests python-dotenv
 
+   Register this device from a teacher session (POST /api/devices) and put the
+   returned key in ATTENDANCE_API_KEY.
+
 2. In your face recognition code, when you detect a known face:
    
    # Your face recognition logic here
@@ -1,11 +1,43 @@
 import React, { useState, useEffect } from 'react';
 import { BrowserRouter, Routes, Route, Navigate } from 'react-router-dom';
+import axios from 'axios';
 import './App.css';
 import LoginPage from './components/LoginPage';
 import Dashboard from './components/Dashboard';
 import ManualAttendance from './components/ManualAttendance';
 import StudentStatus from './components/StudentStatus';
 
+const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
+const API = `${BACKEND_URL}/api`;
+
+const setAuthHeader = (accessToken) => {
+  if (accessToken) {
+    axios.defaults.headers.common['Authorization'] = `Bearer ${accessToken}`;
+  } else {
+    delete axios.defaults.headers.common['Authorization'];
+  }
+};
+
+// Refresh tokens are single use, so concurrent 401s must share one refresh request
+let refreshPromise = null;
+
+const refreshTokens = (savedAuth) => {
+  if (!refreshPromise) {
+    refreshPromise = axios
+      .post(`${API}/token/refresh`, { refresh_token: savedAuth.refresh_token })
+      .then((response) => {
+        const authData = { ...savedAuth, ...response.data };
+        localStorage.setItem('teacherAuth', JSON.stringify(authData));
+        setAuthHeader(authData.access_token);
+        return authData;
+      })
+      .finally(() => {
+        refreshPromise = null;
+      });
+  }
+  return refreshPromise;
+};
+
 function App() {
   const [isAuthenticated, setIsAuthenticated] = useState(false);
   const [teacherInfo, setTeacherInfo] = useState(null);
@@ -15,18 +47,58 @@ function App() {
     const savedAuth = localStorage.getItem('teacherAuth');
     if (savedAuth) {
       const authData = JSON.parse(savedAuth);
+      setAuthHeader(authData.access_token);
       setIsAuthenticated(true);
       setTeacherInfo(authData);
     }
   }, []);
 
+  useEffect(() => {
+    // Access tokens are short-lived: on a 401, swap the refresh token for a new pair and retry once
+    const interceptor = axios.interceptors.response.use(
+      (response) => response,
+      async (error) => {
+        const original = error.config;
+        const savedAuth = JSON.parse(localStorage.getItem('teacherAuth') || 'null');
+        if (
+          error.response?.status !== 401 ||
+          original._retried ||
+          original.url === `${API}/token/refresh` ||
+          !savedAuth?.refresh_token
+        ) {
+          return Promise.reject(error);
+        }
+        original._retried = true;
+        try {
+          // A request sent with an older token than the saved one only needs a retry, not another refresh
+          const authData = original.headers['Authorization'] === `Bearer ${savedAuth.access_token}`
+            ? await refreshTokens(savedAuth)
+            : savedAuth;
+          setTeacherInfo(authData);
+          original.headers['Authorization'] = `Bearer ${authData.access_token}`;
+          return axios(original);
+        } catch (refreshError) {
+          handleLogout();
+          return Promise.reject(error);
+        }
+      }
+    );
+    return () => axios.interceptors.response.eject(interceptor);
+  }, []);
+
   const handleLogin = (teacherData) => {
+    setAuthHeader(teacherData.access_token);
     setIsAuthenticated(true);
     setTeacherInfo(teacherData);
     localStorage.setItem('teacherAuth', JSON.stringify(teacherData));
   };
 
   const handleLogout = () => {
+    const savedAuth = JSON.parse(localStorage.getItem('teacherAuth') || 'null');
+    if (savedAuth?.refresh_token) {
+      axios.post(`${API}/logout`, { refresh_token: savedAuth.refresh_token }).catch(() => {});
+    }
+    setAuthHeader(null);
     setIsAuthenticated(false);
     setTeacherInfo(null);
     localStorage.removeItem('teacherAuth');
@@ -1,4 +1,4 @@
-import React, { useState } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { Link } from 'react-router-dom';
 import axios from 'axios';
 import { ArrowLeft, Search, Calendar, User, TrendingUp, AlertCircle, School, LogOut } from 'lucide-react';
@@ -8,6 +8,10 @@ const API = `${BACKEND_URL}/api`;
 
 const StudentStatus = ({ teacherInfo, onLogout }) => {
   const [searchId, setSearchId] = useState('');
+  const [suggestions, setSuggestions] = useState([]);
+  const [suggestionsQuery, setSuggestionsQuery] = useState('');
+  const searchRequest = useRef(0);
+  const selectedQuery = useRef(null);
   const [studentData, setStudentData] = useState(null);
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState('');
@@ -27,16 +31,44 @@ const StudentStatus = ({ teacherInfo, onLogout }) => {
     return { class: 'status-needs-attention', label: 'Needs Attention' };
   };
 
-  const handleSearch = async (e) => {
-    e.preventDefault();
-    if (!searchId.trim()) return;
+  useEffect(() => {
+    // Debounce typing, and drop responses for anything but the latest request
+    const query = searchId.trim();
+    const request = ++searchRequest.current;
+    if (!query || query === selectedQuery.current) {
+      setSuggestions([]);
+      return;
+    }
+    const timer = setTimeout(async () => {
+      try {
+        const response = await axios.get(`${API}/students/search`, { params: { q: query, limit: 8 } });
+        if (request === searchRequest.current) {
+          setSuggestions(response.data);
+          setSuggestionsQuery(query);
+        }
+      } catch (err) {
+        if (request === searchRequest.current) {
+          setSuggestions([]);
+        }
+      }
+    }, 200);
+    return () => clearTimeout(timer);
+  }, [searchId]);
 
+  const handleSearchChange = (e) => {
+    selectedQuery.current = null;
+    setSearchId(e.target.value);
+  };
+
+  const fetchStudentStatus = async (studentId) => {
+    searchRequest.current++;
     setLoading(true);
     setError('');
     setStudentData(null);
+    setSuggestions([]);
 
     try {
-      const response = await axios.get(`${API}/student-status/${searchId.trim()}`);
+      const response = await axios.get(`${API}/student-status/${studentId}`);
       setStudentData(response.data);
     } catch (err) {
       setError(err.response?.status === 404 ? 
@@ -48,6 +80,25 @@ const StudentStatus = ({ teacherInfo, onLogout }) => {
     }
   };
 
+  const handleSearch = async (e) => {
+    e.preventDefault();
+    const query = searchId.trim();
+    if (!query) return;
+
+    // Typing a name searches by name; fall back to treating the input as a Student ID.
+    // Suggestions still loading for an older query must not pick the student.
+    const current = suggestionsQuery === query ? suggestions : [];
+    const exactMatch = current.find(s => s.student_id.toLowerCase() === query.toLowerCase());
+    const studentId = exactMatch?.student_id || current[0]?.student_id || query;
+    await fetchStudentStatus(studentId);
+  };
+
+  const handleSuggestionClick = async (student) => {
+    selectedQuery.current = student.student_id;
+    setSearchId(student.student_id);
+    await fetchStudentStatus(student.student_id);
+  };
+
   const generateCalendar = () => {
     if (!studentData) return null;
 
@@ -204,7 +255,7 @@ const StudentStatus = ({ teacherInfo, onLogout }) => {
           <div className="card-header">
             <h2 className="card-title">Search Student Status</h2>
             <p className="card-description">
-              Enter a student ID to view detailed attendance information and calendar view.
+              Enter a student name or ID to view detailed attendance information and calendar view.
             </p>
           </div>
 
@@ -213,17 +264,32 @@ const StudentStatus = ({ teacherInfo, onLogout }) => {
               <div className="search-group">
                 <label className="form-label" htmlFor="studentId">
                   <User size={16} style={{ display: 'inline', marginRight: '0.5rem' }} />
-                  Student ID
+                  Student Name or ID
                 </label>
                 <input
                   type="text"
                   id="studentId"
                   className="form-input"
                   value={searchId}
-                  onChange={(e) => setSearchId(e.target.value)}
-                  placeholder="Enter Student ID (e.g., STU001)"
+                  onChange={handleSearchChange}
+                  placeholder="Enter a name or Student ID (e.g., Simran or STU001)"
+                  autoComplete="off"
                   required
                 />
+                {suggestions.length > 0 && (
+                  <div style={{ border: '1px solid #e5e7eb', borderRadius: '6px', marginTop: '0.25rem', background: 'white' }}>
+                    {suggestions.map((student) => (
+                      <div
+                        key={student.student_id}
+                        onClick={() => handleSuggestionClick(student)}
+                        style={{ padding: '0.5rem 0.75rem', cursor: 'pointer', display: 'flex', justifyContent: 'space-between' }}
+                      >
+                        <span>{student.name}</span>
+                        <span style={{ color: '#6b7280' }}>{student.student_id}</span>
+                      </div>
+                    ))}
+                  </div>
+                )}
               </div>
               <div>
                 <button type="submit" className="btn btn-primary" disabled={loading}>
@@ -0,0 +1,49 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from server import SEARCH_RANK_LIMIT, StudentSearchIndex
+
+
+def test_exact_word_matches_outrank_prefix_matches_on_broad_queries():
+    index = StudentSearchIndex()
+    # Far more prefix-only matches than exact matches, and all of them sort first by name
+    for i in range(SEARCH_RANK_LIMIT + 100):
+        index.add({"id": f"a{i}", "student_id": f"A{i:05d}", "name": "Aaron Singhania"})
+    for i in range(20):
+        index.add({"id": f"b{i}", "student_id": f"B{i:05d}", "name": "Bob Singh"})
+
+    results = index.search("singh", 5)
+
+    assert [r["name"] for r in results] == ["Bob Singh"] * 5
+    assert all(r["score"] == 3.0 for r in results)
+
+
+def test_exact_word_matches_survive_removals():
+    index = StudentSearchIndex()
+    for i in range(SEARCH_RANK_LIMIT + 100):
+        index.add({"id": f"a{i}", "student_id": f"A{i:05d}", "name": "Aaron Singhania"})
+    for i in range(80):
+        index.add({"id": f"b{i}", "student_id": f"B{i:05d}", "name": "Bob Singh"})
+    for i in range(0, 80, 2):
+        index.remove(f"B{i:05d}")
+
+    results = index.search("singh", 3)
+
+    assert [r["student_id"] for r in results] == ["B00001", "B00003", "B00005"]
+
+
+def test_words_sharing_a_prefix_are_indexed_once():
+    index = StudentSearchIndex()
+    index.add({"id": "1", "student_id": "S1", "name": "Sam Sid"})
+    index.add({"id": "2", "student_id": "S2", "name": "Sara Singh"})
+
+    assert index.trie["children"]["s"]["top"] == [("sam sid", "S1"), ("sara singh", "S2")]
+
+    index.add({"id": "1", "student_id": "S1", "name": "Sam Sidhu"})
+    index.remove("S2")
+    index.remove("S1")
+
+    assert index.trie["children"] == {}
+    assert index.search("s") == []